@@ -2,24 +2,37 @@
 
 from langgraph.graph import StateGraph, START
 from typing import TypedDict, Annotated
-from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langchain_openai import ChatOpenAI
 from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import tools_condition
+from pydantic import TypeAdapter
 from dotenv import load_dotenv
+import asyncio
+import json
+from functools import partial
 import sqlite3
-from tools import ALL_TOOLS
-from prompts import TRIP_PLANNER_SYSTEM_PROMPT
 
+# Load .env before importing tools, which reads its API keys at import time
 load_dotenv()
 
+from tools import ALL_TOOLS, calculate, tool_executor
+from prompts import TRIP_PLANNER_SYSTEM_PROMPT
+
 # -------------------
 # 1. LLM
 # -------------------
 llm = ChatOpenAI()
 tools = ALL_TOOLS
-llm_with_tools = llm.bind_tools(tools)
+TOOLS_BY_NAME = {t.name: t for t in tools}
+TOOL_VALIDATORS = {t.name: TypeAdapter(t.args_schema) for t in tools}
+TOOL_TIMEOUT_SECONDS = 30
+# Tool schemas serialized once; passed straight to the OpenAI call in chat_node
+_OPENAI_TOOLS_SPEC = [convert_to_openai_tool(t) for t in tools]
+_SYSTEM_MSG = SystemMessage(content=TRIP_PLANNER_SYSTEM_PROMPT)
 
 # -------------------
 # 3. State
@@ -30,23 +43,111 @@ class ChatState(TypedDict):
 # -------------------
 # 4. Nodes
 # -------------------
+MAX_LLM_HISTORY_MESSAGES = 40
+
+def trim_history(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """Keep only the most recent MAX_LLM_HISTORY_MESSAGES for the LLM prompt.
+
+    The window starts at a HumanMessage, or else is widened back to the AI
+    message that issued the tool calls, so a tool result is never sent
+    without the call that requested it. The checkpointed state keeps the
+    full history.
+    """
+    if len(messages) <= MAX_LLM_HISTORY_MESSAGES:
+        return messages
+
+    start = len(messages) - MAX_LLM_HISTORY_MESSAGES
+    for i in range(start, len(messages)):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    while start > 0 and isinstance(messages[start], ToolMessage):
+        start -= 1
+    return messages[start:]
+
 def chat_node(state: ChatState):
     """LLM node that may answer or request a tool call."""
-    messages = state["messages"]
+    messages = trim_history(state["messages"])
 
     # Add system prompt if not already present
     if not messages or not isinstance(messages[0], SystemMessage):
-        messages = [SystemMessage(content=TRIP_PLANNER_SYSTEM_PROMPT)] + messages
+        messages = [_SYSTEM_MSG, *messages]
 
-    response = llm_with_tools.invoke(messages)
+    response = llm.invoke(messages, tools=_OPENAI_TOOLS_SPEC, tool_choice="auto")
     return {"messages": [response]}
 
-tool_node = ToolNode(tools)
+def _tool_message(call: dict, result) -> ToolMessage:
+    """Wrap a tool result (or the exception it raised) in a ToolMessage."""
+    if isinstance(result, Exception):
+        return ToolMessage(
+            content=f"Error: {result!r}",
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="error",
+        )
+    content = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+    return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"])
+
+def _resolve_tool(call: dict):
+    """Return (function, kwargs) for a tool call, validating args on the way."""
+    name = call["name"]
+    if name == "calculator":
+        # Trivial arithmetic: LLM args are already JSON numbers, skip validation
+        return calculate, call["args"]
+    if name not in TOOLS_BY_NAME:
+        raise ValueError(f"Unknown tool '{name}'")
+    # Validate with the precompiled adapter and call the plain function,
+    # skipping LangChain's per-call tool dispatch
+    args = TOOL_VALIDATORS[name].validate_python(call["args"]).model_dump()
+    return TOOLS_BY_NAME[name].func, args
+
+def _run_tool(call: dict):
+    func, args = _resolve_tool(call)
+    return func(**args)
+
+async def _arun_tool(call: dict):
+    func, args = _resolve_tool(call)
+    if func is calculate:
+        return calculate(**args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(tool_executor, partial(func, **args))
+
+async def parallel_tool_node(state: ChatState):
+    """Execute all tool calls of the last AI message concurrently."""
+    tool_calls = state["messages"][-1].tool_calls
+    results = await asyncio.gather(
+        *(_arun_tool(call) for call in tool_calls),
+        return_exceptions=True,
+    )
+    return {"messages": [_tool_message(c, r) for c, r in zip(tool_calls, results)]}
+
+def sync_tool_node(state: ChatState):
+    """Sync entry point used by chatbot.stream(); fans tool calls out over the shared executor."""
+    tool_calls = state["messages"][-1].tool_calls
+    futures = [tool_executor.submit(_run_tool, call) for call in tool_calls]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result(timeout=TOOL_TIMEOUT_SECONDS))
+        except Exception as e:
+            results.append(e)
+    return {"messages": [_tool_message(c, r) for c, r in zip(tool_calls, results)]}
+
+tool_node = RunnableLambda(sync_tool_node, afunc=parallel_tool_node, name="tools")
 
 # -------------------
 # 5. Checkpointer
 # -------------------
 conn = sqlite3.connect(database="chatbot.db", check_same_thread=False)
+# WAL lets readers (thread listing) run alongside checkpoint writes and
+# avoids an fsync of the rollback journal on every put
+conn.executescript("""
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+PRAGMA cache_size=-65536;
+""")
 checkpointer = SqliteSaver(conn=conn)
 
 # -------------------
@@ -68,6 +169,18 @@ chatbot = graph.compile(checkpointer=checkpointer)
 # 7. Helper
 # -------------------
 def retrieve_all_threads():
+    try:
+        # Share the saver's lock: the connection is used across Streamlit sessions
+        with checkpointer.lock:
+            # Oldest activity first; the sidebar reverses it to show recent threads on top
+            cur = conn.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(rowid)"
+            )
+            return [row[0] for row in cur.fetchall()]
+    except sqlite3.OperationalError:
+        # Table missing or schema changed: fall back to the checkpointer API
+        pass
+
     all_threads = set()
     for checkpoint in checkpointer.list(None):
         all_threads.add(checkpoint.config["configurable"]["thread_id"])
@@ -1,6 +1,8 @@
 import streamlit as st
 from backend import chatbot, retrieve_all_threads
+from tools import speculative_prefetch
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+import time
 import uuid
 
 
@@ -13,6 +15,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+STREAM_FLUSH_INTERVAL = 0.04  # seconds
+
 # =========================== Utilities ===========================
 def generate_thread_id():
     return uuid.uuid4()
@@ -52,7 +56,8 @@ if st.sidebar.button("New Chat"):
 
 st.sidebar.header("My Conversations")
 for thread_id in st.session_state["chat_threads"][::-1]:
-    if st.sidebar.button(str(thread_id)):
+    # Short id prefix as label; the full id keeps the widget key unique
+    if st.sidebar.button(str(thread_id)[:8], key=f"thread_{thread_id}"):
         st.session_state["thread_id"] = thread_id
         messages = load_conversation(thread_id)
 
@@ -72,6 +77,9 @@ for message in st.session_state["message_history"]:
 user_input = st.chat_input("Type here")
 
 if user_input:
+    # Warm tool caches for obvious requests while the LLM is thinking
+    speculative_prefetch(user_input)
+
     # Show user's message
     st.session_state["message_history"].append({"role": "user", "content": user_input})
     with st.chat_message("user"):
@@ -87,8 +95,12 @@ if user_input:
     with st.chat_message("assistant"):
         # Use a mutable holder so the generator can set/modify it
         status_holder = {"box": None, "logs": []}
+        chunks = []
 
         def ai_only_stream():
+            # Buffer tokens and flush at most every STREAM_FLUSH_INTERVAL seconds
+            buf = []
+            last_flush = time.monotonic()
             for message_chunk, metadata in chatbot.stream(
                 {"messages": [HumanMessage(content=user_input)]},
                 config=CONFIG,
@@ -138,9 +150,19 @@ if user_input:
 
                 # Stream ONLY assistant tokens
                 if isinstance(message_chunk, AIMessage):
-                    yield message_chunk.content
+                    chunks.append(message_chunk.content)
+                    buf.append(message_chunk.content)
+                    now = time.monotonic()
+                    if now - last_flush > STREAM_FLUSH_INTERVAL:
+                        yield "".join(buf)
+                        buf.clear()
+                        last_flush = now
+
+            if buf:
+                yield "".join(buf)
 
-        ai_message = st.write_stream(ai_only_stream())
+        st.write_stream(ai_only_stream())
+        ai_message = "".join(chunks)
 
         # Finalize only if a tool was actually used
         if status_holder["box"] is not None:
@@ -153,4 +175,4 @@ if user_input:
     # Save assistant message
     st.session_state["message_history"].append(
         {"role": "assistant", "content": ai_message}
-    )
\ No newline at end of file
+    )
@@ -3,15 +3,20 @@ Trip Planner Tools
 All tool functions with @tool decorator for dynamic LLM tool selection
 """
 import os
+import re
+import time
+import operator
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, Optional
-import requests
+import httpx
+import orjson
 import diskcache
-from serpapi import GoogleSearch
+import numpy as np
 from langchain_core.tools import tool
-from dotenv import load_dotenv
-
-load_dotenv()
 
 # Configure logging
 logging.basicConfig(
@@ -20,11 +25,69 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# API keys are read once at import; .env is loaded by backend.py before this module
+SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+
+if os.getenv("APP_ENV") == "production":
+    _missing = [name for name, value in (
+        ("SERPAPI_API_KEY", SERPAPI_API_KEY),
+        ("OPENWEATHER_API_KEY", OPENWEATHER_API_KEY),
+    ) if not value]
+    if _missing:
+        raise RuntimeError(f"Missing required environment variables: {', '.join(_missing)}")
+
 # Initialize cache
 cache = diskcache.Cache(os.getenv("CACHE_DIR", "./cache"))
 
+# Shared HTTP client so SerpAPI/OpenWeather calls reuse pooled keep-alive connections
+SERPAPI_URL = "https://serpapi.com/search"
+OPENWEATHER_ASSISTANT_URL = "https://api.openweathermap.org/assistant/session"
+_http = httpx.Client(
+    timeout=30,
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+)
+
+# Bounded pool for the I/O-bound tool bodies (tool node fan-out and prefetch)
+tool_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+# Process-local LRU in front of diskcache: key -> (expires_at, value)
+MEM_CACHE_MAXSIZE = 1024
+_mem_cache: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+_mem_lock = threading.Lock()
+
+# In-flight SerpAPI searches by cache key, so identical concurrent calls share one request
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
 # ====================== Utility Tools ======================
 
+_OPS = {
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+    "div": operator.truediv,
+}
+
+
+def calculate(first_num: float, second_num: float, operation: str) -> dict:
+    """Plain arithmetic used by the calculator tool and the tool node fast path"""
+    # The fast path skips pydantic, so coerce LLM args like "2" here
+    try:
+        first_num, second_num = float(first_num), float(second_num)
+    except (TypeError, ValueError):
+        return {"error": "first_num and second_num must be numbers"}
+
+    op = _OPS.get(operation)
+    if op is None:
+        return {"error": f"Unsupported operation '{operation}'"}
+    if operation == "div" and second_num == 0:
+        return {"error": "Division by zero is not allowed"}
+
+    result = op(first_num, second_num)
+    return {"first_num": first_num, "second_num": second_num, "operation": operation, "result": result}
+
+
 @tool
 def calculator(first_num: float, second_num: float, operation: str) -> dict:
     """
@@ -32,20 +95,7 @@ def calculator(first_num: float, second_num: float, operation: str) -> dict:
     Supported operations: add, sub, mul, div
     """
     try:
-        if operation == "add":
-            result = first_num + second_num
-        elif operation == "sub":
-            result = first_num - second_num
-        elif operation == "mul":
-            result = first_num * second_num
-        elif operation == "div":
-            if second_num == 0:
-                return {"error": "Division by zero is not allowed"}
-            result = first_num / second_num
-        else:
-            return {"error": f"Unsupported operation '{operation}'"}
-        
-        return {"first_num": first_num, "second_num": second_num, "operation": operation, "result": result}
+        return calculate(first_num, second_num, operation)
     except Exception as e:
         return {"error": str(e)}
 
@@ -77,37 +127,62 @@ def google_search(query: str) -> dict:
     response = {}
 
     # 1. Extract AI-generated text summary from text_blocks
-    text_blocks = result.get("text_blocks", [])
     summary_parts = []
-
-    for block in text_blocks:
+    for block in result.get("text_blocks", []):
         block_type = block.get("type")
         snippet = block.get("snippet", "")
 
-        if block_type in ["heading", "paragraph"]:
-            if snippet:
-                summary_parts.append(snippet)
+        if block_type in ("heading", "paragraph") and snippet:
+            summary_parts.append(snippet)
         elif block_type == "list":
-            list_items = block.get("list", [])
-            for item in list_items:
-                item_snippet = item.get("snippet", "") or item.get("title", "")
-                if item_snippet:
-                    summary_parts.append(f"• {item_snippet}")
+            items = (item.get("snippet") or item.get("title") for item in block.get("list", []))
+            summary_parts.extend(f"• {item}" for item in items if item)
 
-    response["summary"] = "\n\n".join(summary_parts) if summary_parts else "No summary available"
+    response["summary"] = "\n\n".join(summary_parts) or "No summary available"
     return response
 
 
 # ====================== Caching Utilities ======================
 
+def _mem_set(key: str, value: Any, expires_at: float) -> None:
+    with _mem_lock:
+        _mem_cache[key] = (expires_at, value)
+        _mem_cache.move_to_end(key)
+        while len(_mem_cache) > MEM_CACHE_MAXSIZE:
+            _mem_cache.popitem(last=False)
+
+
 def get_cached(key: str) -> Optional[Any]:
-    """Get cached value by key"""
-    return cache.get(key)
+    """Get cached value by key (memory first, then disk)"""
+    with _mem_lock:
+        entry = _mem_cache.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                _mem_cache.move_to_end(key)
+                return value
+            del _mem_cache[key]
+
+    value, expires_at = cache.get(key, expire_time=True)
+    if value is not None:
+        # Promote disk hit into memory, keeping the disk expiry
+        _mem_set(key, value, expires_at if expires_at is not None else float("inf"))
+    return value
 
 
 def set_cached(key: str, value: Any, expiry_hours: int = 6) -> None:
     """Set cached value with expiry"""
-    cache.set(key, value, expire=expiry_hours * 3600)
+    expire = expiry_hours * 3600
+    cache.set(key, value, expire=expire)
+    _mem_set(key, value, time.time() + expire)
+
+
+def make_cache_key(prefix: str, params: Any) -> str:
+    """Build a short, fixed-length cache key from a prefix and request params"""
+    digest = hashlib.blake2b(
+        orjson.dumps(params, option=orjson.OPT_SORT_KEYS), digest_size=16
+    ).hexdigest()
+    return f"{prefix}:{digest}"
 
 
 def _serpapi_search(params: Dict[str, Any], cache_key_prefix: str = "") -> Dict[str, Any]:
@@ -121,7 +196,7 @@ def _serpapi_search(params: Dict[str, Any], cache_key_prefix: str = "") -> Dict[
     Returns:
         Search results dictionary
     """
-    cache_key = f"{cache_key_prefix}:{str(params)}"
+    cache_key = make_cache_key(cache_key_prefix, params)
 
     # Check cache
     cached_result = get_cached(cache_key)
@@ -129,15 +204,40 @@ def _serpapi_search(params: Dict[str, Any], cache_key_prefix: str = "") -> Dict[
         logger.info(f"Cache hit for {cache_key_prefix}")
         return cached_result
 
-    # Execute search
+    # Coalesce identical concurrent searches: followers wait for the leader's result
+    with _inflight_lock:
+        future = _inflight.get(cache_key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[cache_key] = future
+
+    if not is_leader:
+        logger.info(f"Joining in-flight search for {cache_key_prefix}")
+        return future.result()
+
+    try:
+        # A previous leader may have finished between our cache check and registering
+        result = get_cached(cache_key) or _fetch_serpapi(params, cache_key, cache_key_prefix)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(cache_key, None)
+
+
+def _fetch_serpapi(params: Dict[str, Any], cache_key: str, cache_key_prefix: str) -> Dict[str, Any]:
+    """Execute the SerpAPI request and cache the result"""
     try:
-        api_key = os.getenv("SERPAPI_API_KEY")
-        if not api_key:
+        if not SERPAPI_API_KEY:
             return {"error": "SERPAPI_API_KEY not found in environment"}
 
-        params["api_key"] = api_key
-        search = GoogleSearch(params)
-        result = search.get_dict()
+        params["api_key"] = SERPAPI_API_KEY
+        response = _http.get(SERPAPI_URL, params=params)
+        result = orjson.loads(response.content)
 
         # Cache result
         set_cached(cache_key, result)
@@ -257,26 +357,29 @@ def search_hotels(
     # Extract properties
     properties = result.get("properties", [])
 
-    # Sort by value (price + rating composite score)
-    def calculate_value_score(hotel):
-        price = hotel.get("rate_per_night", {}).get("extracted_lowest", 0)
-        rating = hotel.get("overall_rating", 0)
-
-        if not price or price == 0:
-            return 0
-
-        # Normalize (assuming max price ~500, max rating 5)
-        norm_price = min(price / 500, 1.0)
-        norm_rating = rating / 5.0 if rating else 0
-
-        # 60% weight on price, 40% on rating
-        return (1 - norm_price) * 0.6 + norm_rating * 0.4
-
-    sorted_properties = sorted(properties, key=calculate_value_score, reverse=True)
+    # Sort by value (price + rating composite score), vectorized over all properties
+    prices = np.fromiter(
+        ((p.get("rate_per_night") or {}).get("extracted_lowest") or 0 for p in properties),
+        dtype=np.float32,
+        count=len(properties)
+    )
+    ratings = np.fromiter(
+        (p.get("overall_rating") or 0 for p in properties),
+        dtype=np.float32,
+        count=len(properties)
+    )
+
+    # Normalize (assuming max price ~500, max rating 5)
+    # 60% weight on price, 40% on rating; unpriced hotels score 0
+    scores = (1 - np.minimum(prices / 500, 1.0)) * 0.6 + (ratings / 5.0) * 0.4
+    scores[prices == 0] = 0
+
+    order = np.argsort(-scores, kind="stable")
+    sorted_properties = [properties[i] for i in order[:10]]
 
     # Format hotel data
     hotels = []
-    for prop in sorted_properties[:10]:  # Top 10 hotels
+    for prop in sorted_properties:  # Top 10 hotels
         hotels.append({
             "name": prop.get("name"),
             "price": prop.get("rate_per_night", {}).get("extracted_lowest"),
@@ -304,8 +407,7 @@ def search_weather(location: str, start_date: str, end_date: str) -> dict:
     Returns:
         Dictionary with human-readable weather forecast information
     """
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    if not api_key:
+    if not OPENWEATHER_API_KEY:
         return {"error": "OPENWEATHER_API_KEY not found in environment"}
 
     # Create natural language prompt
@@ -319,15 +421,13 @@ def search_weather(location: str, start_date: str, end_date: str) -> dict:
         return {"weather": cached_result}
 
     try:
-        url = "https://api.openweathermap.org/assistant/session"
-        response = requests.post(
-            url,
+        response = _http.post(
+            OPENWEATHER_ASSISTANT_URL,
             headers={
                 "Content-Type": "application/json",
-                "X-Api-Key": api_key
+                "X-Api-Key": OPENWEATHER_API_KEY
             },
-            json={"prompt": prompt},
-            timeout=30
+            json={"prompt": prompt}
         )
         response.raise_for_status()
 
@@ -436,6 +536,70 @@ def search_youtube_vlogs(query: str, max_results: int = 5) -> dict:
     return {"videos": videos, "count": len(videos)}
 
 
+# ====================== Speculative Prefetch ======================
+
+_DATE = r"(\d{4}-\d{2}-\d{2})"
+_FLIGHT_RE = re.compile(
+    rf"from\s+([A-Za-z][A-Za-z .]*?)\s+to\s+([A-Za-z][A-Za-z .]*?)\s+on\s+{_DATE}"
+    rf"(?:.*?(?:returning|return|back)(?:\s+on)?\s+{_DATE})?",
+    re.IGNORECASE
+)
+_HOTEL_RE = re.compile(
+    rf"hotels?\s+in\s+([A-Za-z][A-Za-z ,.]*?)\s+from\s+{_DATE}\s+(?:to|until)\s+{_DATE}",
+    re.IGNORECASE
+)
+
+
+def _prefetch_calls(text: str) -> list:
+    """Guess (tool function, kwargs) pairs the LLM is likely to request for this message"""
+    calls = []
+
+    for departure, arrival, outbound_date, return_date in _FLIGHT_RE.findall(text):
+        calls.append((search_flights.func, {
+            "departure": departure.strip(),
+            "arrival": arrival.strip(),
+            "outbound_date": outbound_date,
+            "return_date": return_date or None
+        }))
+
+    for location, check_in_date, check_out_date in _HOTEL_RE.findall(text):
+        calls.append((search_hotels.func, {
+            "location": location.strip(" ,."),
+            "check_in_date": check_in_date,
+            "check_out_date": check_out_date
+        }))
+
+    return calls
+
+
+def _run_prefetch(func, kwargs: Dict[str, Any]) -> None:
+    try:
+        func(**kwargs)
+    except Exception as e:
+        logger.debug(f"Speculative prefetch failed for {func.__name__}: {str(e)}")
+
+
+def speculative_prefetch(text: str) -> int:
+    """
+    Warm the cache for tool calls the user message obviously implies, so the
+    LLM's own tool calls hit cache. Runs on the shared tool executor; results
+    are discarded.
+
+    Args:
+        text: Raw user message
+
+    Returns:
+        Number of prefetches started
+    """
+    calls = _prefetch_calls(text)
+    for func, kwargs in calls:
+        tool_executor.submit(_run_prefetch, func, kwargs)
+
+    if calls:
+        logger.info(f"Started {len(calls)} speculative prefetch(es)")
+    return len(calls)
+
+
 # Export all tools as a list
 ALL_TOOLS = [
     search_flights,